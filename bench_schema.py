@@ -0,0 +1,229 @@
+"""Benchmarks for schema validation.
+
+Run ``python bench_schema.py`` to time every case with every way of
+validating, ``--save FILE`` to also write the results as JSON, and
+``--compare FILE`` to show the change against results saved earlier, for
+example on another commit.  Throughput is in validations per second, and
+peak is the largest amount of memory allocated during one validation.
+
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:  # Python < 3.4
+    tracemalloc = None
+
+from schema import Schema, And, Or, Use, Optional, SchemaError
+
+
+CASES = []
+
+
+def case(f, per_record=False):
+    """Register a function returning a schema and data for it."""
+    CASES.append((f.__name__, f, per_record))
+    return f
+
+
+def batch_case(f):
+    """Register a case whose data is a batch of records to validate."""
+    return case(f, per_record=True)
+
+
+@case
+def literals():
+    return Schema(['red', 'green', 'blue']), ['red', 'green', 'blue'] * 333
+
+
+@case
+def predicates():
+    return Schema([lambda n: n >= 0]), list(range(1000))
+
+
+@case
+def validators():
+    return Schema([Use(int)]), [str(i) for i in range(1000)]
+
+
+@case
+def types():
+    return Schema([int]), list(range(1000))
+
+
+@case
+def dict_wide():
+    schema = dict(('field%d' % i, int) for i in range(200))
+    return Schema(schema), dict(('field%d' % i, i) for i in range(200))
+
+
+@case
+def dict_optional_defaults():
+    schema = dict((Optional('field%d' % i, default=i), int)
+                  for i in range(100))
+    return Schema(schema), dict(('field%d' % i, i) for i in range(0, 100, 2))
+
+
+@case
+def iterable_heterogeneous():
+    schema = Schema([int, float, str, {'kind': str, 'value': int}])
+    items = [1, 2.5, 'three', {'kind': 'four', 'value': 4}]
+    return schema, items * 2500
+
+
+@case
+def and_or():
+    return (Schema([And(Or(int, float), lambda n: n > 0, Use(float))]),
+            [1, 2.5] * 500)
+
+
+@case
+def nested_config():
+    def config(depth):
+        if depth == 0:
+            return {'name': str, 'port': And(int, lambda n: 0 < n < 65536),
+                    Optional('debug', default=False): bool}
+        return {'name': str, 'children': [config(depth - 1)]}
+
+    def data(depth):
+        if depth == 0:
+            return {'name': 'leaf', 'port': 8080}
+        return {'name': 'node%d' % depth,
+                'children': [data(depth - 1), data(depth - 1)]}
+    return Schema(config(8)), data(8)
+
+
+@case
+def readme_people():
+    schema = Schema([{'name': And(str, len),
+                      'age': And(Use(int), lambda n: 18 <= n <= 99),
+                      Optional('sex'): And(str, Use(str.lower),
+                                           lambda s: s in ('male', 'female'))}])
+    data = [{'name': 'Sue', 'age': '28', 'sex': 'FEMALE'},
+            {'name': 'Sam', 'age': '42'},
+            {'name': 'Sacha', 'age': '20', 'sex': 'Male'}]
+    return schema, data * 300
+
+
+@batch_case
+def mostly_invalid():
+    schema = Schema({'id': int, 'tags': [Or('a', 'b', 'c')],
+                     Optional('score'): And(float, lambda f: 0 <= f <= 1)})
+    records = []
+    for i in range(1000):
+        if i % 10 < 3:
+            records.append({'id': i, 'tags': ['a', 'b'], 'score': 0.5})
+        elif i % 10 < 6:
+            records.append({'id': str(i), 'tags': ['a']})
+        elif i % 10 < 8:
+            records.append({'id': i, 'tags': ['a', 'd'] * 10})
+        else:
+            records.append({'id': i, 'tags': [], 'score': 2.0})
+    return schema, records
+
+
+def modes(schema, per_record):
+    """Return the ways of validating with `schema`, by name."""
+    def catching(validate):
+        def f(data):
+            try:
+                validate(data)
+            except SchemaError:
+                pass
+        return f
+    found = [('validate', catching(schema.validate)),
+             ('is_valid', schema.is_valid),
+             ('codegen', catching(schema.compile('codegen').validate))]
+    if per_record:
+        return [(mode, lambda records, f=f: [f(r) for r in records])
+                for mode, f in found]
+    return found
+
+
+def measure(f, data, min_time, repeat):
+    number = 1
+    while True:
+        elapsed = timeit.timeit(lambda: f(data), number=number)
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = min([elapsed] + timeit.repeat(lambda: f(data), number=number,
+                                         repeat=repeat - 1))
+    result = {'ops_per_sec': number / best}
+    if tracemalloc is not None:
+        tracemalloc.start()
+        f(data)
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names, min_time, repeat):
+    results = {}
+    for name, make, per_record in CASES:
+        if names and name not in names:
+            continue
+        schema, data = make()
+        for mode, f in modes(schema, per_record):
+            results.setdefault(name, {})[mode] = measure(f, data, min_time,
+                                                         repeat)
+    return {'commit': commit(), 'python': platform.python_version(),
+            'results': results}
+
+
+def report(results, baseline=None):
+    line = '%-24s %-9s %14s %12s'
+    print(line % ('case', 'mode', 'validations/s', 'peak KiB'), end='')
+    print('  change' if baseline else '')
+    for name in sorted(results['results']):
+        for mode, r in sorted(results['results'][name].items()):
+            peak = r.get('peak_bytes')
+            print(line % (name, mode, '%.1f' % r['ops_per_sec'],
+                          '-' if peak is None else '%.1f' % (peak / 1024.)),
+                  end='')
+            old = (baseline or {}).get('results', {}).get(name, {}).get(mode)
+            if old:
+                print('  %+.1f%%' % (100. * r['ops_per_sec'] /
+                                     old['ops_per_sec'] - 100), end='')
+            print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('cases', nargs='*', help='cases to run (default all)')
+    parser.add_argument('--save', metavar='FILE', help='write results as JSON')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare with results saved earlier')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds per timing run (default 0.2)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timing runs per case, best is kept (default 3)')
+    args = parser.parse_args(argv)
+    results = run(args.cases, args.min_time, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
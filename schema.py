@@ -1,14 +1,69 @@
 __version__ = '0.3.1'
 
 
+import time
+from abc import ABCMeta
+
+try:
+    from reprlib import Repr
+except ImportError:  # Python 2
+    from repr import Repr
+
+
 class SchemaError(Exception):
 
-    """Error during Schema validation."""
+    """Error during Schema validation.
+
+    Besides the ``autos``/``errors`` messages, an error carries the
+    offending ``data``, the ``schema`` that rejected it, and the ``path`` of
+    keys and indices leading to it from the validated value.  Messages are
+    only formatted when they are read.
+
+    """
+
+    def __init__(self, autos, errors, data=None, schema=None):
+        self._autos = autos if type(autos) is list else [autos]
+        self._errors = errors if type(errors) is list else [errors]
+        self._rendered = False
+        self._path = []  # innermost first, see `path`
+        self.data = data
+        self.schema = schema
+        Exception.__init__(self)
 
-    def __init__(self, autos, errors):
-        self.autos = autos if type(autos) is list else [autos]
-        self.errors = errors if type(errors) is list else [errors]
-        Exception.__init__(self, self.code)
+    @property
+    def autos(self):
+        if not self._rendered:
+            self._autos = [str(a) if type(a) is _Message else a
+                           for a in self._autos]
+            self._rendered = True
+        return self._autos
+
+    @autos.setter
+    def autos(self, autos):
+        self._autos = autos
+        self._rendered = False
+
+    @property
+    def errors(self):
+        return self._errors
+
+    @errors.setter
+    def errors(self, errors):
+        self._errors = errors
+
+    @property
+    def path(self):
+        return tuple(reversed(self._path))
+
+    @property
+    def args(self):
+        return (self.code,)
+
+    def __str__(self):
+        return self.code
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.code)
 
     @property
     def code(self):
@@ -23,6 +78,100 @@ class SchemaError(Exception):
             return '\n'.join(e)
         return '\n'.join(a)
 
+    def __reduce__(self):
+        # Messages are rendered; `data` and `schema` may not be picklable
+        # and are dropped.
+        return self.__class__, (self.autos, self.errors), {'_path': self._path}
+
+    def _wrap(self, auto, error):
+        """Return a new error nesting this one under `auto` and `error`."""
+        x = SchemaError([auto] + self._autos, [error] + self._errors,
+                        self.data, self.schema)
+        x._path = self._path
+        return x
+
+
+class _Message(object):
+
+    """Error message formatted only when it is read.
+
+    `format` is either a %-format string, whose arguments are shown with
+    a bounded repr, or a function returning the message.
+
+    """
+
+    def __init__(self, format, *args):
+        self._format = format
+        self._args = args
+
+    def __str__(self):
+        if callable(self._format):
+            return self._format(*self._args)
+        return self._format % tuple(_Bounded(a) for a in self._args)
+
+
+class _Bounded(object):
+
+    def __init__(self, value):
+        self._value = value
+
+    def __repr__(self):
+        return _repr(self._value)
+
+    def __str__(self):
+        return str(self._value)
+
+
+class _Repr(Repr):
+
+    def __init__(self):
+        Repr.__init__(self)
+        self.maxlevel = 6
+        self.maxtuple = self.maxlist = self.maxarray = self.maxdict = 20
+        self.maxset = self.maxfrozenset = self.maxdeque = 20
+        self.maxstring = self.maxlong = self.maxother = 200
+
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+_REPR_BUDGET = 1000  # rough number of items and characters
+_REPR_DEPTH = 100  # stay well clear of the recursion limit
+_reprlib = _Repr()
+
+# `_hashed` are types whose equality agrees with their hash, so that a
+# dict lookup can stand in for comparing against each of many literals.
+try:
+    _strings = (basestring, bytes)
+    _hashed = frozenset([type(None), bool, int, long, float, str, unicode])
+except NameError:  # Python 3
+    _strings = (str, bytes)
+    _hashed = frozenset([type(None), bool, int, float, str, bytes])
+
+
+def _repr(value):
+    """Return `repr(value)`, abbreviated if `value` is very large."""
+    budget = _REPR_BUDGET
+    stack = [(value, 0)]
+    while stack:
+        value_, depth = stack.pop()
+        t = type(value_)
+        if t in (list, tuple, set, frozenset, dict):
+            budget -= len(value_)
+            if budget < 0 or depth > _REPR_DEPTH:
+                return _reprlib.repr(value)
+            depth += 1
+            for v in value_:
+                stack.append((v, depth))
+                if t is dict:
+                    stack.append((value_[v], depth))
+        elif isinstance(value_, _strings):
+            budget -= len(value_)
+        else:
+            budget -= 1
+        if budget < 0:
+            return _reprlib.repr(value)
+    return repr(value)
+
 
 class And(object):
 
@@ -30,28 +179,27 @@ class And(object):
         self._args = args
         assert list(kw) in (['error'], [])
         self._error = kw.get('error')
+        self._compiled = None
 
     def __repr__(self):
         return '%s(%s)' % (self.__class__.__name__,
                            ', '.join(repr(a) for a in self._args))
 
+    def __getstate__(self):
+        return dict(self.__dict__, _compiled=None)
+
     def validate(self, data):
-        for s in [Schema(s, error=self._error) for s in self._args]:
-            data = s.validate(data)
-        return data
+        if self._compiled is None:
+            self._compiled = _Compiler().and_(self)
+        return self._compiled.validate(data)
 
 
 class Or(And):
 
     def validate(self, data):
-        x = SchemaError([], [])
-        for s in [Schema(s, error=self._error) for s in self._args]:
-            try:
-                return s.validate(data)
-            except SchemaError as _x:
-                x = _x
-        raise SchemaError(['%r did not validate %r' % (self, data)] + x.autos,
-                          [self._error] + x.errors)
+        if self._compiled is None:
+            self._compiled = _Compiler().or_(self)
+        return self._compiled.validate(data)
 
 
 class Use(object):
@@ -68,10 +216,27 @@ class Use(object):
         try:
             return self._callable(data)
         except SchemaError as x:
-            raise SchemaError([None] + x.autos, [self._error] + x.errors)
+            raise x._wrap(None, self._error)
         except BaseException as x:
-            f = self._callable.__name__
-            raise SchemaError('%s(%r) raised %r' % (f, data, x), self._error)
+            raise self._raised(data, x)
+
+    def _raised(self, data, x):
+        f = self._callable.__name__
+        return SchemaError(_Message('%s(%r) raised %r', f, data, x),
+                           self._error, data, self)
+
+
+class AsyncUse(Use):
+
+    """Like `Use`, for a callable returning an awaitable, like a coroutine.
+
+    Schemas using it must be validated with `Schema.validate_async`.
+
+    """
+
+    def validate(self, data):
+        raise TypeError('%r must be awaited, use Schema.validate_async()'
+                        % (self,))
 
 
 COMPARABLE, CALLABLE, VALIDATOR, TYPE, DICT, ITERABLE = range(6)
@@ -95,98 +260,199 @@ def priority(s):
 
 class Schema(object):
 
-    def __init__(self, schema, error=None):
+    """Schema for validating data.
+
+    With ``copy=False``, containers whose part of the schema cannot change
+    any value (no ``Use``, no custom validators, no ``Optional`` defaults)
+    are returned as they are instead of being rebuilt.
+
+    """
+
+    def __init__(self, schema, error=None, copy=True):
         self._schema = schema
         self._error = error
+        self._copy = copy
+        self._compiled = None
+        self._generated = None
+        self._compiled_async = None
 
     def __repr__(self):
         return '%s(%r)' % (self.__class__.__name__, self._schema)
 
-    def validate(self, data):
-        s = self._schema
-        e = self._error
-        flavor = priority(s)
-        if flavor == ITERABLE:
-            data = Schema(type(s), error=e).validate(data)
-            return type(s)(Or(*s, error=e).validate(d) for d in data)
-        if flavor == DICT:
-            data = Schema(dict, error=e).validate(data)
-            new = type(data)()  # new - is a dict of the validated values
-            x = None
-            coverage = set()  # matched schema keys
-            # for each key and value find a schema entry matching them, if any
-            sorted_skeys = sorted(s, key=priority)
-            for key, value in data.items():
-                valid = False
-                skey = None
-                for skey in sorted_skeys:
-                    svalue = s[skey]
-                    try:
-                        nkey = Schema(skey, error=e).validate(key)
-                    except SchemaError:
-                        pass
-                    else:
-                        try:
-                            nvalue = Schema(svalue, error=e).validate(value)
-                        except SchemaError as _x:
-                            x = _x
-                            raise
-                        else:
-                            coverage.add(skey)
-                            valid = True
-                            break
-                if valid:
-                    new[nkey] = nvalue
-                elif skey is not None:
-                    if x is not None:
-                        raise SchemaError(['Invalid value for key %r' % key] +
-                                          x.autos, [e] + x.errors)
-            required = set(k for k in s if type(k) is not Optional)
-            if not required.issubset(coverage):
-                raise SchemaError('Missing keys: %s' %
-                                  ", ".join(required - coverage), e)
-            if len(new) != len(data):
-                wrong_keys = set(data.keys()) - set(new.keys())
-                s_wrong_keys = ', '.join(repr(k) for k in sorted(wrong_keys))
-                raise SchemaError('Wrong keys %s in %r' % (s_wrong_keys, data),
-                                  e)
-
-            # Apply default-having optionals that haven't been used:
-            defaults = set(k for k in s if type(k) is Optional and
-                           hasattr(k, 'default')) - coverage
-            for default in defaults:
-                new[default.key] = default.default
+    def __getstate__(self):
+        return dict(self.__dict__, _compiled=None, _generated=None,
+                    _compiled_async=None)
 
-            return new
-        if flavor == TYPE:
-            if isinstance(data, s):
-                return data
-            else:
-                raise SchemaError('%r should be instance of %r' %
-                                  (data, s.__name__), e)
-        if flavor == VALIDATOR:
-            try:
-                return s.validate(data)
-            except SchemaError as x:
-                raise SchemaError([None] + x.autos, [e] + x.errors)
-            except BaseException as x:
-                raise SchemaError('%r.validate(%r) raised %r' % (s, data, x),
-                                  self._error)
-        if flavor == CALLABLE:
-            f = s.__name__
-            try:
-                if s(data):
-                    return data
-            except SchemaError as x:
-                raise SchemaError([None] + x.autos, [e] + x.errors)
-            except BaseException as x:
-                raise SchemaError('%s(%r) raised %r' % (f, data, x),
-                                  self._error)
-            raise SchemaError('%s(%r) should evaluate to True' % (f, data), e)
-        if s == data:
-            return data
-        else:
-            raise SchemaError('%r does not match %r' % (s, data), e)
+    def compile(self, backend='tree'):
+        """Return a validator built from this schema.
+
+        The schema is walked once and turned into a tree of specialized
+        nodes, so repeated validation does no dispatch on the schema and
+        creates no intermediate ``Schema`` objects.  The result is cached;
+        the schema is assumed not to change after it is first compiled.
+
+        With ``backend='codegen'`` the tree is in turn compiled to Python
+        source with the checks inlined, whose ``validate`` function is
+        faster still and raises the same errors.  The generated code is
+        available as the validator's ``source``.
+
+        """
+        if self._compiled is None:
+            self._compiled = _Compiler(self._copy).compile(self._schema,
+                                                           self._error)
+        if backend == 'tree':
+            return self._compiled
+        if backend == 'codegen':
+            if self._generated is None:
+                self._generated = _CodeGen().generate(self._compiled)
+            return self._generated
+        raise ValueError('unknown backend %r' % (backend,))
+
+    def validate(self, data, profile=None, executor=None):
+        """Return `data` validated, or raise `SchemaError`.
+
+        Passing a `Profile` records where validation spends its time.
+
+        With an `executor`, like a ``concurrent.futures.ThreadPoolExecutor``,
+        blocking checks (``Use``, predicates and custom validators) of the
+        values of dicts and the items of lists run in its workers, all at
+        once.  Only this thread submits work, and each ``And`` or ``Or``
+        runs as a whole in one worker.  Results are put back in order, and
+        the error raised is the one raised without an executor, though
+        values after it may have been validated too.
+
+        """
+        if profile is not None:
+            return profile._compile(self).validate(data)
+        if executor is not None:
+            return self.compile().schedule(data, executor.submit)()
+        return self.compile().validate(data)
+
+    def validate_async(self, data, limit=None):
+        """Return a coroutine validating `data`, awaiting async checks.
+
+        Checks to await are `AsyncUse` and coroutine functions used as
+        predicates.  Those of the values of a dict or the items of a list
+        run concurrently, at most `limit` at a time if it is given.  The
+        alternatives of ``Or`` and the steps of ``And`` still run one after
+        another, and keys are checked synchronously.  The error raised is
+        the one ``validate`` would raise: that of the first failing value,
+        in order.  Needs Python 3.5 or later.
+
+        """
+        from schema_async import validate_async
+        return validate_async(self, data, limit)
+
+    def is_valid(self, data):
+        """Return whether `data` is valid, without copying or converting it.
+
+        Validation stops at the first mismatch and no error messages are
+        built.  ``Use`` conversions are only run where a later check in the
+        same ``And`` needs their result.
+
+        """
+        return self.compile().is_valid(data)
+
+    def iter_validate(self, iterable):
+        """Validate the items of `iterable` lazily against a list schema.
+
+        Returns an iterator yielding each validated item as it is reached,
+        so `iterable` may be a generator or too large to hold in memory.
+        Its type is not checked.  A failing item raises `SchemaError` with
+        the item's index as the first element of ``path``.
+
+        """
+        node = self.compile()
+        if type(node) is not _Iterable:
+            raise TypeError('iter_validate() needs a list-like schema, '
+                            'not %r' % (self._schema,))
+        return node.iter_validate(iterable)
+
+    def validate_many(self, records, workers=None, chunksize=100):
+        """Validate each of `records`, using a pool of `workers` processes.
+
+        Returns a list holding, in the order of `records`, either the
+        validated record or the `SchemaError` it raised.  The schema is sent
+        to each worker once, when the pool starts; records and results are
+        sent in chunks of `chunksize`.  `workers` defaults to the number of
+        CPUs, and with ``workers=1`` everything runs in this process.
+
+        """
+        import multiprocessing
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if workers <= 1:
+            return [_validate_or_error(self, r) for r in records]
+        pool = multiprocessing.Pool(workers, _init_worker, (self,))
+        try:
+            return list(pool.imap(_validate_in_worker, records, chunksize))
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+def _validate_or_error(schema, data):
+    try:
+        return schema.validate(data)
+    except SchemaError as x:
+        return x
+
+
+def _init_worker(schema):
+    global _worker_schema
+    _worker_schema = schema
+
+
+def _validate_in_worker(record):
+    return _validate_or_error(_worker_schema, record)
+
+
+class Profile(object):
+
+    """Statistics on the time spent in each part of a schema.
+
+    Pass a profile to `Schema.validate` to record, for each node of the
+    schema, how often it was called, how often it failed and the time
+    spent in it, including its children.  For an ``Or`` it also records
+    how many alternatives were tried.  Nodes are named by their path from
+    the root, like ``root['items'][*]['price'].and[1]``.  A profile can be
+    used with several schemas and validations; it is not thread-safe.
+
+    """
+
+    def __init__(self):
+        self._stats = {}  # path -> [calls, failures, seconds, tried]
+        self._compiled = {}  # id(schema) -> (schema, instrumented node)
+
+    def _compile(self, schema):
+        if id(schema) not in self._compiled:
+            node = _ProfileCompiler(self, schema._copy).compile_root(
+                schema._schema, schema._error)
+            self._compiled[id(schema)] = (schema, node)
+        return self._compiled[id(schema)][1]
+
+    def _entry(self, path):
+        return self._stats.setdefault(path, [0, 0, 0.0, 0])
+
+    @property
+    def stats(self):
+        """Return a dict of statistics for each path."""
+        return dict((path, {'calls': calls, 'failures': failures,
+                            'time': time, 'tried': tried})
+                    for path, (calls, failures, time, tried)
+                    in self._stats.items())
+
+    def report(self, limit=20):
+        """Return a table of the `limit` nodes with the most time spent."""
+        line = '%10s %8s %8s %10s %8s  %s'
+        lines = [line % ('time (ms)', 'calls', 'failed', 'us/call',
+                         'tried', 'path')]
+        ranked = sorted(self._stats.items(), key=lambda i: -i[1][2])
+        for path, (calls, failures, time, tried) in ranked[:limit]:
+            lines.append(line % ('%.3f' % (time * 1e3), calls, failures,
+                                 '%.2f' % (time * 1e6 / (calls or 1)),
+                                 tried or '', path))
+        return '\n'.join(lines)
 
 
 MARKER = object()
@@ -208,3 +474,1001 @@ class Optional(Schema):
                     '"%r" is too complex.' % (self._schema,))
             self.default = default
             self.key = self._schema
+
+
+class _Compiler(object):
+
+    """Walk a schema once and build a tree of validator nodes.
+
+    Containers are memoized, so a schema that refers to itself compiles
+    to a node tree with the same loop in it.  Unless `copy` is set,
+    containers that cannot change any value are not rebuilt.
+
+    """
+
+    def __init__(self, copy=True):
+        self._copy = copy
+        self._memo = {}
+
+    def compile(self, s, error=None):
+        flavor = priority(s)
+        if flavor == ITERABLE:
+            return self._iterable(s, error)
+        if flavor == DICT:
+            return self._dict(s, error)
+        if flavor == TYPE:
+            return _Type(s, error)
+        if flavor == VALIDATOR:
+            return _Validator(s, self._validator(s), error)
+        if flavor == CALLABLE:
+            return _Predicate(s, error)
+        return _Literal(s, error)
+
+    def and_(self, s):
+        return _And([self._child(a, s._error, ('and', i))
+                     for i, a in enumerate(s._args)])
+
+    def or_(self, s):
+        return _Or(s, [self._child(a, s._error, ('or', i))
+                       for i, a in enumerate(s._args)], s._error)
+
+    def _child(self, s, error, step):
+        """Compile `s`, reached from the schema being compiled by `step`.
+
+        `step` is ('key', schema key), ('and', index), ('or', index) or
+        ('item', index, number of alternatives).
+
+        """
+        return self.compile(s, error)
+
+    def _items(self, s, error):
+        return _Or(Or(*s, error=error),
+                   [self._child(a, error, ('item', i, len(s)))
+                    for i, a in enumerate(s)], error)
+
+    def _new(self, cls, s, *args):
+        """Return a new `cls` node for the container `s`."""
+        return cls(*args)
+
+    def _validator(self, s):
+        if type(s) is And:
+            return self.and_(s)
+        if type(s) is Or:
+            return self.or_(s)
+        if type(s) is Use:
+            return _Use(s)
+        if type(s) is AsyncUse:
+            raise TypeError('%r must be awaited, use Schema.validate_async()'
+                            % (s,))
+        if type(s) in (Schema, Optional):
+            return self.compile(s._schema, s._error)
+        return _Generic(s)
+
+    def _iterable(self, s, error):
+        memo = (id(s), id(error))
+        if memo not in self._memo:
+            node = self._memo[memo] = self._new(_Iterable, s, type(s), error)
+            node._setup(self._items(s, error), self._copy)
+        return self._memo[memo]
+
+    def _dict(self, s, error):
+        memo = (id(s), id(error))
+        if memo not in self._memo:
+            node = self._memo[memo] = self._new(_Dict, s, s, error)
+            entries = [(k, self.compile(k, error),
+                        self._child(s[k], error, ('key', k)))
+                       for k in sorted(s, key=priority)]
+            node._setup(entries,
+                        [k for k in s if type(k) is not Optional],
+                        [k for k in s if type(k) is Optional and
+                         hasattr(k, 'default')], self._copy)
+        return self._memo[memo]
+
+
+class _ProfileCompiler(_Compiler):
+
+    """Compile a schema with every node timed, for a `Profile`."""
+
+    def __init__(self, profile, copy=True):
+        _Compiler.__init__(self, copy)
+        self._profile = profile
+        self._path = 'root'
+
+    def compile_root(self, s, error):
+        return _Timed(self.compile(s, error), self._profile._entry('root'))
+
+    def _child(self, s, error, step):
+        outer = self._path
+        tried = None
+        if step[0] == 'key':
+            key = step[1]._schema if type(step[1]) is Optional else step[1]
+            if priority(key) == COMPARABLE:
+                self._path += '[%r]' % (key,)
+            else:
+                self._path += '[%s]' % getattr(key, '__name__', key)
+        elif step[0] == 'and':
+            self._path += '.and[%d]' % step[1]
+        elif step[0] == 'or':
+            self._path += '.or[%d]' % step[1]
+            tried = self._profile._entry(outer)
+        elif step[2] == 1:  # the only alternative for items
+            self._path += '[*]'
+        else:
+            self._path += '[*].or[%d]' % step[1]
+            tried = self._profile._entry(outer + '[*]')
+        try:
+            return _Timed(self.compile(s, error),
+                          self._profile._entry(self._path), tried)
+        finally:
+            self._path = outer
+
+    def _items(self, s, error):
+        node = _Compiler._items(self, s, error)
+        if len(s) > 1:
+            node = _Timed(node, self._profile._entry(self._path + '[*]'))
+        return node
+
+
+_INVALID = object()  # returned by `probe` for data that does not validate
+
+
+class _Node(object):
+
+    """A compiled schema.
+
+    Besides ``validate``, every node answers ``is_valid``, and ``probe``,
+    which returns the validated data or ``_INVALID``.  Neither of them
+    formats messages or raises `SchemaError`, and ``is_valid`` copies
+    nothing.  Nodes that may return something other than the data they
+    were given set `transforms`, and those that may call out to code that
+    blocks, like ``Use`` or predicates, set `blocks`.
+
+    """
+
+    transforms = False
+    blocks = False
+    types = None  # when set, only instances of these types can be valid
+
+    def is_valid(self, data):
+        return self.probe(data) is not _INVALID
+
+    def probe(self, data):
+        return data if self.is_valid(data) else _INVALID
+
+    def schedule(self, data, submit):
+        """Start validating `data`, passing blocking work to `submit`.
+
+        `submit` is the ``submit`` method of an executor.  Returns a
+        function that waits for the validated data and returns it, or
+        raises its error.  Containers schedule each of their values, so
+        that the blocking checks of all of them run at once, and only this
+        thread submits anything.
+
+        """
+        if self.blocks:
+            return submit(self.validate, data).result
+        try:
+            data = self.validate(data)
+        except SchemaError as x:
+            return _failed(x)
+        return lambda: data
+
+
+class _Type(_Node):
+
+    def __init__(self, type_, error):
+        self._type = type_
+        self._error = error
+        # Other metaclasses may answer isinstance() by looking at the value
+        if type(type_) in (type, ABCMeta):
+            self.types = (type_,)
+
+    def validate(self, data):
+        if isinstance(data, self._type):
+            return data
+        raise self._fail(data)
+
+    def _fail(self, data):
+        return SchemaError(_Message('%r should be instance of %r',
+                                    data, self._type.__name__),
+                           self._error, data, self._type)
+
+    def is_valid(self, data):
+        return isinstance(data, self._type)
+
+
+class _Literal(_Node):
+
+    def __init__(self, value, error):
+        self._value = value
+        self._error = error
+
+    def validate(self, data):
+        if self._value == data:
+            return data
+        raise self._fail(data)
+
+    def _fail(self, data):
+        return SchemaError(_Message('%r does not match %r', self._value, data),
+                           self._error, data, self._value)
+
+    def is_valid(self, data):
+        return bool(self._value == data)
+
+
+class _Predicate(_Node):
+
+    blocks = True
+
+    def __init__(self, callable_, error):
+        self._callable = callable_
+        self._name = getattr(callable_, '__name__', repr(callable_))
+        self._error = error
+
+    def validate(self, data):
+        try:
+            if self._callable(data):
+                return data
+        except SchemaError as x:
+            raise x._wrap(None, self._error)
+        except BaseException as x:
+            raise self._raised(data, x)
+        raise self._fail(data)
+
+    def _raised(self, data, x):
+        return SchemaError(_Message('%s(%r) raised %r', self._name, data, x),
+                           self._error, data, self._callable)
+
+    def _fail(self, data):
+        return SchemaError(_Message('%s(%r) should evaluate to True',
+                                    self._name, data),
+                           self._error, data, self._callable)
+
+    def is_valid(self, data):
+        try:
+            return bool(self._callable(data))
+        except BaseException:
+            return False
+
+
+class _Use(_Node):
+
+    transforms = True
+    blocks = True
+
+    def __init__(self, use):
+        self._use = use
+        self._callable = use._callable
+        self.validate = use.validate
+
+    def probe(self, data):
+        return self._callable(data)  # _Validator turns errors into _INVALID
+
+
+class _Generic(_Node):
+
+    """A user-defined object with a ``validate`` method."""
+
+    transforms = True
+    blocks = True
+
+    def __init__(self, validator):
+        self.validate = self.probe = validator.validate
+
+
+class _Validator(_Node):
+
+    """Run an object's ``validate`` method, nesting its errors."""
+
+    def __init__(self, schema, node, error):
+        self._schema = schema
+        self._node = node
+        self._validate = node.validate
+        self._error = error
+        self.transforms = node.transforms
+        self.blocks = node.blocks
+        self.types = node.types
+
+    def validate(self, data):
+        try:
+            return self._validate(data)
+        except SchemaError as x:
+            raise x._wrap(None, self._error)
+        except BaseException as x:
+            raise self._raised(data, x)
+
+    def schedule(self, data, submit):
+        if not self.blocks:
+            return _Node.schedule(self, data, submit)
+        node = self._node.schedule(data, submit)
+
+        def result():
+            try:
+                return node()
+            except SchemaError as x:
+                raise x._wrap(None, self._error)
+            except BaseException as x:
+                raise self._raised(data, x)
+        return result
+
+    def _raised(self, data, x):
+        return SchemaError(_Message('%r.validate(%r) raised %r',
+                                    self._schema, data, x),
+                           self._error, data, self._schema)
+
+    def is_valid(self, data):
+        try:
+            return self._node.is_valid(data)
+        except BaseException:
+            return False
+
+    def probe(self, data):
+        try:
+            return self._node.probe(data)
+        except BaseException:
+            return _INVALID
+
+
+class _And(_Node):
+
+    def __init__(self, nodes):
+        self._nodes = nodes
+        self._validators = [n.validate for n in nodes]
+        self.transforms = any(n.transforms for n in nodes)
+        self.blocks = any(n.blocks for n in nodes)
+        if nodes:
+            self.types = nodes[0].types
+
+    def validate(self, data):
+        for validate in self._validators:
+            data = validate(data)
+        return data
+
+    def is_valid(self, data):
+        for node in self._nodes:
+            if not node.transforms:
+                if not node.is_valid(data):
+                    return False
+            else:
+                data = node.probe(data)
+                if data is _INVALID:
+                    return False
+        return True
+
+    def probe(self, data):
+        for node in self._nodes:
+            data = node.probe(data)
+            if data is _INVALID:
+                break
+        return data
+
+
+class _Or(_Node):
+
+    """Try alternatives in order, skipping those that cannot match.
+
+    Alternatives that only accept certain types are skipped for data of
+    other types; the candidates for each type are worked out once and
+    kept.  When all alternatives are plain literals, a dict lookup decides.
+    Errors are the same as when trying every alternative: the error of the
+    last one, which fails on its type check if it was skipped.
+
+    """
+
+    def __init__(self, schema, nodes, error):
+        self._schema = schema
+        self._nodes = nodes
+        self._error = error
+        self._by_type = {}
+        self._literals = None
+        self.transforms = any(n.transforms for n in nodes)
+        self.blocks = any(n.blocks for n in nodes)
+        if nodes and all(n.types is not None for n in nodes):
+            self.types = tuple(t for n in nodes for t in n.types)
+        if nodes and all(type(n) is _Literal and type(n._value) in _hashed
+                         and n._value == n._value for n in nodes):
+            self._literals = {}
+            for n in nodes:
+                self._literals.setdefault(n._value, (n,))
+
+    def _candidates(self, data):
+        t = type(data)
+        if self._literals is not None and t in _hashed:
+            return self._literals.get(data, ())
+        try:
+            return self._by_type[t]
+        except KeyError:
+            pass
+        if getattr(data, '__class__', t) is not t:  # isinstance() may differ
+            return self._nodes
+        self._by_type[t] = candidates = [
+            n for n in self._nodes if n.types is None or issubclass(t, n.types)]
+        return candidates
+
+    def validate(self, data):
+        candidates = self._candidates(data) if len(self._nodes) > 1 else \
+            self._nodes
+        x = None
+        for node in candidates:
+            try:
+                return node.validate(data)
+            except SchemaError as _x:
+                x = _x
+        if candidates and candidates[-1] is not self._nodes[-1]:
+            x = None
+        raise self._error_for(data, x)
+
+    def _error_for(self, data, x):
+        """Return the error for `data`, given that of the last alternative.
+
+        If the last alternative was skipped, `x` is None, and the error
+        comes from running it now: it fails on its type check.
+
+        """
+        if x is None and self._nodes:
+            try:
+                self._nodes[-1].validate(data)
+            except SchemaError as _x:
+                x = _x
+        if x is None:
+            x = SchemaError([], [], data, self._schema)
+        return x._wrap(_Message('%r did not validate %r', self._schema, data),
+                       self._error)
+
+    def schedule(self, data, submit):
+        if len(self._nodes) != 1 or not self.blocks:
+            return _Node.schedule(self, data, submit)
+        node = self._nodes[0].schedule(data, submit)
+
+        def result():
+            try:
+                return node()
+            except SchemaError as x:
+                raise self._error_for(data, x)
+        return result
+
+    def is_valid(self, data):
+        for node in (self._candidates(data) if len(self._nodes) > 1 else
+                     self._nodes):
+            if node.is_valid(data):
+                return True
+        return False
+
+    def probe(self, data):
+        for node in (self._candidates(data) if len(self._nodes) > 1 else
+                     self._nodes):
+            new = node.probe(data)
+            if new is not _INVALID:
+                return new
+        return _INVALID
+
+
+class _Timed(_Node):
+
+    """Record calls, failures and time spent in a node, for `Profile`."""
+
+    def __init__(self, node, stats, tried=None):
+        self._node = node
+        self._stats = stats
+        self._tried = tried  # stats of the Or this is an alternative of
+        self.transforms = node.transforms
+        self.blocks = node.blocks
+        self.types = node.types
+        self.is_valid = node.is_valid
+        self.probe = node.probe
+
+    def validate(self, data):
+        stats = self._stats
+        stats[0] += 1
+        if self._tried is not None:
+            self._tried[3] += 1
+        start = _clock()
+        try:
+            return self._node.validate(data)
+        except SchemaError:
+            stats[1] += 1
+            raise
+        finally:
+            stats[2] += _clock() - start
+
+
+class _Iterable(_Node):
+
+    transforms = blocks = True  # until set up, in case of a loop
+
+    def __init__(self, type_, error):
+        self._type = type_
+        self._check = _Type(type_, error)
+
+    def _setup(self, items, copy):
+        self._items = items
+        self._item = items.validate
+        self.transforms = copy or items.transforms
+        self.blocks = items.blocks
+
+    def validate(self, data):
+        data = self._check.validate(data)
+        item = self._item
+        if not self.transforms:
+            i = 0
+            try:
+                for i, d in enumerate(data):
+                    item(d)
+            except SchemaError as x:
+                x._path.append(i)
+                raise
+            return data
+        new = []
+        append = new.append
+        try:
+            for d in data:
+                append(item(d))
+        except SchemaError as x:
+            x._path.append(len(new))
+            raise
+        return new if self._type is list else self._type(new)
+
+    def schedule(self, data, submit):
+        if not self.blocks:
+            return _Node.schedule(self, data, submit)
+        try:
+            data = self._check.validate(data)
+        except SchemaError as x:
+            return _failed(x)
+        items = [self._items.schedule(d, submit) for d in data]
+
+        def result():
+            new = []
+            try:
+                for item in items:
+                    new.append(item())
+            except SchemaError as x:
+                x._path.append(len(new))
+                raise
+            if not self.transforms:
+                return data
+            return new if self._type is list else self._type(new)
+        return result
+
+    def iter_validate(self, data):
+        item = self._item
+        for i, d in enumerate(data):
+            try:
+                d = item(d)
+            except SchemaError as x:
+                x._path.append(i)
+                raise
+            yield d
+
+    def is_valid(self, data):
+        if not isinstance(data, self._type):
+            return False
+        is_valid = self._items.is_valid
+        for d in data:
+            if not is_valid(d):
+                return False
+        return True
+
+    def probe(self, data):
+        if not self.transforms:
+            return data if self.is_valid(data) else _INVALID
+        if not isinstance(data, self._type):
+            return _INVALID
+        probe = self._items.probe
+        new = []
+        for d in data:
+            d = probe(d)
+            if d is _INVALID:
+                return d
+            new.append(d)
+        return self._type(new)
+
+
+class _Dict(_Node):
+
+    transforms = blocks = True  # until set up, in case of a loop
+
+    def __init__(self, schema, error):
+        self._schema = schema
+        self._error = error
+        self._check = _Type(dict, error)
+
+    def _setup(self, entries, required, defaults, copy):
+        # `entries` are (schema key, key node, value node) in priority order.
+        # Literal keys, plain or Optional, are looked up by hash; the rest
+        # are tried one by one.  An Optional literal only wins if none of
+        # the non-literal keys sorted before it matches, so each indexed key
+        # carries the list of those it must try first.
+        self._index = {}
+        self._fallback = []
+        for skey, key_node, value_node in entries:
+            literal = skey._schema if type(skey) is Optional else skey
+            if priority(literal) == COMPARABLE and _hashable(literal):
+                self._index.setdefault(literal, (skey, value_node,
+                                                 list(self._fallback)))
+            else:
+                self._fallback.append((skey, key_node.probe, value_node))
+        self._keys_transform = any(k.transforms for _, k, _ in entries)
+        self._required = required
+        self._required_set = frozenset(required)
+        self._defaults = defaults
+        self.transforms = (copy or bool(defaults) or self._keys_transform or
+                           any(v.transforms for _, _, v in entries))
+        self.blocks = any(k.blocks or v.blocks for _, k, v in entries)
+
+    def _match(self, key):
+        """Return (schema key, validated key, value node) for `key`."""
+        hit = self._index.get(key)
+        for skey, probe_key, value_node in (
+                self._fallback if hit is None else hit[2]):
+            nkey = probe_key(key)
+            if nkey is not _INVALID:
+                return skey, nkey, value_node
+        if hit is not None:
+            return hit[0], key, hit[1]
+        return None
+
+    def validate(self, data):
+        data = self._check.validate(data)
+        # new - is a dict of the validated values, unless nothing can change
+        new = type(data)() if self.transforms else None
+        coverage = set()  # matched schema keys
+        matched = 0
+        match = self._match
+        # for each key and value find a schema entry matching them, if any
+        for key, value in data.items():
+            m = match(key)
+            if m is None:
+                continue
+            skey, nkey, value_node = m
+            try:
+                value = value_node.validate(value)
+            except SchemaError as x:
+                x._path.append(key)
+                raise
+            if new is not None:
+                new[nkey] = value
+            coverage.add(skey)
+            matched += 1
+        return self._finish(data, new, coverage, matched)
+
+    def schedule(self, data, submit):
+        if not self.blocks:
+            return _Node.schedule(self, data, submit)
+        try:
+            data = self._check.validate(data)
+        except SchemaError as x:
+            return _failed(x)
+        values = []
+        for key, value in data.items():
+            m = self._match(key)
+            if m is not None:
+                values.append((key, m, m[2].schedule(value, submit)))
+
+        def result():
+            new = type(data)() if self.transforms else None
+            coverage = set()
+            for key, (skey, nkey, _), value in values:
+                try:
+                    value = value()
+                except SchemaError as x:
+                    x._path.append(key)
+                    raise
+                if new is not None:
+                    new[nkey] = value
+                coverage.add(skey)
+            return self._finish(data, new, coverage, len(values))
+        return result
+
+    def _finish(self, data, new, coverage, matched):
+        """Check which keys matched and return the validated dict."""
+        if not self._required_set <= coverage:
+            missing = [k for k in self._required if k not in coverage]
+            raise SchemaError(_Message(_missing_keys, missing),
+                              self._error, data, self._schema)
+        if new is None:
+            if matched != len(data):
+                new = dict.fromkeys(k for k in data
+                                    if self._match(k) is not None)
+                raise SchemaError(_Message(_wrong_keys, data, new),
+                                  self._error, data, self._schema)
+            return data
+        if len(new) != len(data):
+            raise SchemaError(_Message(_wrong_keys, data, new),
+                              self._error, data, self._schema)
+        # Apply default-having optionals that haven't been used:
+        for default in self._defaults:
+            if default not in coverage:
+                new[default.key] = default.default
+        return new
+
+    def is_valid(self, data):
+        if not isinstance(data, dict):
+            return False
+        coverage = set()
+        nkeys = set()
+        match = self._match
+        for key, value in data.items():
+            m = match(key)
+            if m is None or not m[2].is_valid(value):
+                return False
+            coverage.add(m[0])
+            if self._keys_transform:
+                nkeys.add(m[1])
+        if self._keys_transform and len(nkeys) != len(data):
+            return False
+        return self._required_set <= coverage
+
+    def probe(self, data):
+        if not self.transforms:
+            return data if self.is_valid(data) else _INVALID
+        if not isinstance(data, dict):
+            return _INVALID
+        new = type(data)()
+        coverage = set()
+        match = self._match
+        for key, value in data.items():
+            m = match(key)
+            if m is None:
+                return _INVALID
+            skey, nkey, value_node = m
+            new[nkey] = value_node.probe(value)
+            if new[nkey] is _INVALID:
+                return _INVALID
+            coverage.add(skey)
+        if not self._required_set <= coverage or len(new) != len(data):
+            return _INVALID
+        for default in self._defaults:
+            if default not in coverage:
+                new[default.key] = default.default
+        return new
+
+
+def _failed(x):
+    """Return a function raising `x`, for `_Node.schedule`."""
+    def result():
+        raise x
+    return result
+
+
+def _missing_keys(missing):
+    return 'Missing keys: %s' % ', '.join(str(k) for k in missing)
+
+
+def _wrong_keys(data, new):
+    wrong_keys = set(data.keys()) - set(new.keys())
+    try:
+        wrong_keys = sorted(wrong_keys)
+    except TypeError:  # keys of mixed, unorderable types
+        pass
+    s_wrong_keys = ', '.join(_repr(k) for k in wrong_keys)
+    return 'Wrong keys %s in %s' % (s_wrong_keys, _repr(data))
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _Generated(object):
+
+    """A schema compiled to Python source, see `_CodeGen`."""
+
+    def __init__(self, validate, source):
+        self.validate = validate
+        self.source = source
+
+
+class _CodeGen(object):
+
+    """Generate Python source validating like a compiled node tree.
+
+    Leaf checks, ``And`` chains and validator wrappers are inlined into one
+    function per container, ``Or`` and dict value.  Everything the source
+    refers to (types, literals, callables, and the nodes, which build the
+    errors) is passed in as a global, so errors are the same as the tree's.
+
+    """
+
+    _max_depth = 8  # inlined nesting of try blocks before calling out
+
+    def __init__(self):
+        self._namespace = {'SchemaError': SchemaError, '_INVALID': _INVALID,
+                           '_hashed': _hashed}
+        self._names = {}  # id(object) -> name of the global holding it
+        self._functions = {}  # id(node) -> name of the function for it
+        self._pending = []
+        self._definitions = []
+        self._setup = []  # run once the functions are defined
+        self._locals = 0
+
+    def generate(self, root):
+        name = self._function(root)
+        while self._pending:
+            self._definitions.append(self._define(*self._pending.pop()))
+        source = '\n\n'.join(self._definitions + ['\n'.join(self._setup)])
+        namespace = dict(self._namespace)
+        exec(compile(source, '<schema>', 'exec'), namespace)
+        return _Generated(namespace[name], source)
+
+    def _const(self, value):
+        if type(value) in (type(None), bool, int, str):
+            return repr(value)
+        if id(value) not in self._names:
+            name = self._names[id(value)] = 'c%d' % len(self._names)
+            self._namespace[name] = value
+        return self._names[id(value)]
+
+    def _local(self):
+        self._locals += 1
+        return 'd%d' % self._locals
+
+    def _function(self, node):
+        if id(node) not in self._functions:
+            name = self._functions[id(node)] = 'v%d' % len(self._functions)
+            self._pending.append((node, name))
+        return self._functions[id(node)]
+
+    def _define(self, node, name):
+        if type(node) is _Or:
+            body = self._or(node)
+        elif type(node) is _Iterable:
+            body = self._iterable(node)
+        elif type(node) is _Dict:
+            body = self._dict(node)
+        else:
+            body = self._emit(node, 'data', 0) + ['return data']
+        return 'def %s(data):\n%s' % (name, '\n'.join(_indent(body)))
+
+    def _emit(self, node, var, depth):
+        """Return lines replacing `var` by its value validated by `node`."""
+        t = type(node)
+        n = self._const(node)
+        if t is _Type:
+            return ['if not isinstance(%s, %s):' % (var, self._const(node._type)),
+                    '    raise %s._fail(%s)' % (n, var)]
+        if t is _Literal:
+            return ['if not %s == %s:' % (self._const(node._value), var),
+                    '    raise %s._fail(%s)' % (n, var)]
+        if t is _Predicate:
+            return ['try:',
+                    '    failed = not %s(%s)' % (self._const(node._callable),
+                                                 var),
+                    'except SchemaError as x:',
+                    '    raise x._wrap(None, %s)' % self._const(node._error),
+                    'except BaseException as x:',
+                    '    raise %s._raised(%s, x)' % (n, var),
+                    'if failed:',
+                    '    raise %s._fail(%s)' % (n, var)]
+        if t is _Use:
+            use = node._use
+            return ['try:',
+                    '    %s = %s(%s)' % (var, self._const(use._callable), var),
+                    'except SchemaError as x:',
+                    '    raise x._wrap(None, %s)' % self._const(use._error),
+                    'except BaseException as x:',
+                    '    raise %s._raised(%s, x)' % (self._const(use), var)]
+        if t is _Validator and depth < self._max_depth:
+            data = self._local()
+            return (['%s = %s' % (data, var), 'try:'] +
+                    _indent(self._emit(node._node, var, depth + 1)) +
+                    ['except SchemaError as x:',
+                     '    raise x._wrap(None, %s)' % self._const(node._error),
+                     'except BaseException as x:',
+                     '    raise %s._raised(%s, x)' % (n, data)])
+        if t is _And and depth < self._max_depth:
+            lines = []
+            for child in node._nodes:
+                lines += self._emit(child, var, depth)
+            return lines
+        if t in (_Or, _Iterable, _Dict, _Validator, _And):
+            return ['%s = %s(%s)' % (var, self._function(node), var)]
+        return ['%s = %s(%s)' % (var, self._const(node.validate), var)]
+
+    def _or(self, node):
+        n = self._const(node)
+        lines = []
+        if node._literals is not None:
+            lines += ['if type(data) in _hashed:',
+                      '    if data in %s:' % self._const(node._literals),
+                      '        return data',
+                      '    raise %s._error_for(data, None)' % n]
+        lines.append('last = None')
+        for i, alternative in enumerate(node._nodes):
+            block = (['try:', '    value = data'] +
+                     _indent(self._emit(alternative, 'value', 1)) +
+                     ['    return value', 'except SchemaError as x:'])
+            if i == len(node._nodes) - 1:
+                block.append('    last = x')
+            else:
+                block.append('    pass')
+            if alternative.types is not None and len(node._nodes) > 1:
+                block = (['if isinstance(data, %s):' %
+                          self._const(alternative.types)] + _indent(block))
+            lines += block
+        lines.append('raise %s._error_for(data, last)' % n)
+        return lines
+
+    def _item(self, node, var):
+        """Return lines validating an item of an iterable against `node`."""
+        if len(node._nodes) != 1:
+            return ['%s = %s(%s)' % (var, self._function(node), var)]
+        item = self._local()
+        return (['%s = %s' % (item, var), 'try:'] +
+                _indent(self._emit(node._nodes[0], var, 1)) +
+                ['except SchemaError as x:',
+                 '    raise %s._error_for(%s, x)' % (self._const(node), item)])
+
+    def _iterable(self, node):
+        lines = ['if not isinstance(data, %s):' % self._const(node._type),
+                 '    raise %s._fail(data)' % self._const(node._check)]
+        item = self._item(node._items, 'value')
+        if not node.transforms:
+            return lines + (['i = 0', 'try:',
+                             '    for i, value in enumerate(data):'] +
+                            _indent(item, 2) +
+                            ['except SchemaError as x:',
+                             '    x._path.append(i)',
+                             '    raise',
+                             'return data'])
+        return lines + (['new = []', 'append = new.append', 'try:',
+                         '    for value in data:'] +
+                        _indent(item, 2) +
+                        ['        append(value)',
+                         'except SchemaError as x:',
+                         '    x._path.append(len(new))',
+                         '    raise',
+                         'return new' if node._type is list else
+                         'return %s(new)' % self._const(node._type)])
+
+    def _dict(self, node):
+        index = 'index%d' % len(self._setup)
+        fallback = 'fallback%d' % len(self._setup)
+        self._setup.append('%s = [%s]' % (fallback, ', '.join(
+            '(%s, %s, %s)' % (self._const(skey), self._const(probe_key),
+                              self._function(value_node))
+            for skey, probe_key, value_node in node._fallback)))
+        self._setup.append('%s = {%s}' % (index, ', '.join(
+            '%s: (%s, %s, %s[:%d])' % (self._const(literal), self._const(skey),
+                                       self._function(value_node), fallback,
+                                       len(preceding))
+            for literal, (skey, value_node, preceding)
+            in node._index.items())))
+        lines = ['if not isinstance(data, dict):',
+                 '    raise %s._fail(data)' % self._const(node._check),
+                 'new = type(data)()' if node.transforms else 'new = None',
+                 'coverage = set()',
+                 'matched = 0',
+                 'for key, value in data.items():',
+                 '    hit = %s.get(key)' % index]
+        if node._fallback:
+            lines += ['    for skey, probe_key, validate in (',
+                      '            %s if hit is None else hit[2]):' % fallback,
+                      '        nkey = probe_key(key)',
+                      '        if nkey is not _INVALID:',
+                      '            break',
+                      '    else:',
+                      '        if hit is None:',
+                      '            continue',
+                      '        skey, validate, nkey = hit[0], hit[1], key']
+        else:
+            lines += ['    if hit is None:',
+                      '        continue',
+                      '    skey, validate, nkey = hit[0], hit[1], key']
+        return lines + ['    try:',
+                        '        %s = validate(value)' %
+                        ('new[nkey]' if node.transforms else 'value'),
+                        '    except SchemaError as x:',
+                        '        x._path.append(key)',
+                        '        raise',
+                        '    coverage.add(skey)',
+                        '    matched += 1',
+                        'return %s._finish(data, new, coverage, matched)' %
+                        self._const(node)]
+
+
+def _indent(lines, level=1):
+    return ['    ' * level + line for line in lines]
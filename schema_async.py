@@ -0,0 +1,272 @@
+"""Validation with checks to await, behind `Schema.validate_async`.
+
+Kept apart from `schema` because it needs Python 3.5 or later.  Parts of
+the schema without any check to await compile to the usual nodes and run
+synchronously; the others compile to nodes with an ``avalidate``
+coroutine.
+
+"""
+import asyncio
+import inspect
+
+from schema import (SchemaError, Schema, Optional, And, Or, AsyncUse,
+                    priority, ITERABLE, DICT, VALIDATOR, CALLABLE,
+                    _Compiler, _Node, _Predicate, _Use, _Validator, _And,
+                    _Or, _Iterable, _Dict)
+
+
+async def validate_async(schema, data, limit=None):
+    if schema._compiled_async is None:
+        schema._compiled_async = _AsyncCompiler(schema._copy).compile(
+            schema._schema, schema._error)
+    node = schema._compiled_async
+    if not isinstance(node, _Async):
+        return node.validate(data)
+    return await node.avalidate(
+        data, None if limit is None else asyncio.Semaphore(limit))
+
+
+def _is_coroutine_function(f):
+    return (inspect.iscoroutinefunction(f) or
+            inspect.iscoroutinefunction(getattr(f, '__call__', None)))
+
+
+class _AsyncCompiler(_Compiler):
+
+    """Compile a schema, with nodes to await where it has async checks."""
+
+    def __init__(self, copy=True):
+        _Compiler.__init__(self, copy)
+        self._awaiting = set()  # ids of containers known to have any
+
+    def _awaits(self, s, seen):
+        """Return whether schema `s` has checks to await."""
+        if id(s) in self._awaiting:
+            return True
+        if id(s) in seen:  # a loop, whatever is on it is looked at anyway
+            return False
+        flavor = priority(s)
+        if flavor == ITERABLE:
+            seen.add(id(s))
+            found = any(self._awaits(a, seen) for a in s)
+        elif flavor == DICT:
+            seen.add(id(s))
+            found = any(self._awaits(v, seen) for v in s.values())
+        elif flavor == VALIDATOR:
+            if type(s) is AsyncUse:
+                return True
+            if type(s) in (And, Or):
+                return any(self._awaits(a, seen) for a in s._args)
+            if type(s) in (Schema, Optional):
+                return self._awaits(s._schema, seen)
+            return False
+        else:
+            return flavor == CALLABLE and _is_coroutine_function(s)
+        if found:
+            self._awaiting.add(id(s))
+        return found
+
+    def compile(self, s, error=None):
+        flavor = priority(s)
+        if flavor == VALIDATOR:
+            node = self._validator(s)
+            if isinstance(node, _Async):
+                return _AsyncValidator(s, node, error)
+            return _Validator(s, node, error)
+        if flavor == CALLABLE and _is_coroutine_function(s):
+            return _AwaitPredicate(s, error)
+        return _Compiler.compile(self, s, error)
+
+    def and_(self, s):
+        node = _Compiler.and_(self, s)
+        if any(isinstance(n, _Async) for n in node._nodes):
+            return _AsyncAnd(node._nodes)
+        return node
+
+    def or_(self, s):
+        return self._async_or(_Compiler.or_(self, s))
+
+    def _items(self, s, error):
+        return self._async_or(_Compiler._items(self, s, error))
+
+    def _async_or(self, node):
+        if any(isinstance(n, _Async) for n in node._nodes):
+            return _AsyncOr(node._schema, node._nodes, node._error)
+        return node
+
+    def _validator(self, s):
+        if type(s) is AsyncUse:
+            return _AwaitUse(s)
+        return _Compiler._validator(self, s)
+
+    def _new(self, cls, s, *args):
+        if self._awaits(s, set()):
+            cls = _AsyncIterable if cls is _Iterable else _AsyncDict
+        return cls(*args)
+
+
+class _Async(_Node):
+
+    """A node with checks to await, run by its ``avalidate`` coroutine."""
+
+    def validate(self, data):
+        raise TypeError('checks to await can only run from '
+                        'Schema.validate_async(), and not on keys')
+
+    is_valid = probe = validate
+
+
+async def _call(f, data, limit):
+    if limit is None:
+        return await f(data)
+    async with limit:
+        return await f(data)
+
+
+async def _run(node, data, limit):
+    if isinstance(node, _Async):
+        return await node.avalidate(data, limit)
+    return node.validate(data)
+
+
+async def _validate_all(pairs, limit):
+    """Validate each (node, value) of `pairs`, awaiting checks together.
+
+    Return the list of results and, if a value failed, the position of
+    the first one that did and its error.  Values after a failure that
+    needs no awaiting are not validated.
+
+    """
+    results = []
+    pending = []
+    failed = None
+    for i, (node, value) in enumerate(pairs):
+        if isinstance(node, _Async):
+            pending.append(i)
+            results.append(node.avalidate(value, limit))
+            continue
+        try:
+            results.append(node.validate(value))
+        except SchemaError as x:
+            failed = (i, x)
+            break
+    if pending:
+        done = await asyncio.gather(*[results[i] for i in pending],
+                                    return_exceptions=True)
+        for i, result in zip(pending, done):
+            if isinstance(result, SchemaError):
+                if failed is None or i < failed[0]:
+                    failed = (i, result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                results[i] = result
+    return (results,) + (failed or (None, None))
+
+
+class _AwaitPredicate(_Async, _Predicate):
+
+    async def avalidate(self, data, limit):
+        try:
+            if await _call(self._callable, data, limit):
+                return data
+        except SchemaError as x:
+            raise x._wrap(None, self._error)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as x:
+            raise self._raised(data, x)
+        raise self._fail(data)
+
+
+class _AwaitUse(_Async, _Use):
+
+    async def avalidate(self, data, limit):
+        try:
+            return await _call(self._callable, data, limit)
+        except SchemaError as x:
+            raise x._wrap(None, self._use._error)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as x:
+            raise self._use._raised(data, x)
+
+
+class _AsyncValidator(_Async, _Validator):
+
+    async def avalidate(self, data, limit):
+        try:
+            return await self._node.avalidate(data, limit)
+        except SchemaError as x:
+            raise x._wrap(None, self._error)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as x:
+            raise self._raised(data, x)
+
+
+class _AsyncAnd(_Async, _And):
+
+    async def avalidate(self, data, limit):
+        for node in self._nodes:
+            data = await _run(node, data, limit)
+        return data
+
+
+class _AsyncOr(_Async, _Or):
+
+    async def avalidate(self, data, limit):
+        candidates = self._candidates(data) if len(self._nodes) > 1 else \
+            self._nodes
+        x = None
+        for node in candidates:
+            try:
+                return await _run(node, data, limit)
+            except SchemaError as _x:
+                x = _x
+        if not candidates or candidates[-1] is not self._nodes[-1]:
+            # The last alternative was skipped, its error is the one shown
+            try:
+                await _run(self._nodes[-1], data, limit)
+                x = SchemaError([], [], data, self._schema)
+            except SchemaError as _x:
+                x = _x
+        raise self._error_for(data, x)
+
+
+class _AsyncIterable(_Async, _Iterable):
+
+    async def avalidate(self, data, limit):
+        data = self._check.validate(data)
+        items = self._items
+        new, i, x = await _validate_all([(items, d) for d in data], limit)
+        if x is not None:
+            x._path.append(i)
+            raise x
+        if not self.transforms:
+            return data
+        return new if self._type is list else self._type(new)
+
+
+class _AsyncDict(_Async, _Dict):
+
+    async def avalidate(self, data, limit):
+        data = self._check.validate(data)
+        matches = []
+        for key, value in data.items():
+            m = self._match(key)
+            if m is not None:
+                matches.append((key, m, value))
+        values, i, x = await _validate_all(
+            [(value_node, value) for _, (_, _, value_node), value in matches],
+            limit)
+        if x is not None:
+            x._path.append(matches[i][0])
+            raise x
+        new = type(data)() if self.transforms else None
+        coverage = set()
+        for (_, (skey, nkey, _), _), value in zip(matches, values):
+            if new is not None:
+                new[nkey] = value
+            coverage.add(skey)
+        return self._finish(data, new, coverage, len(matches))
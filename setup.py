@@ -13,7 +13,7 @@ setup(
     license="MIT",
     keywords="schema json validation",
     url="http://github.com/halst/schema",
-    py_modules=['schema'],
+    py_modules=['schema', 'schema_async'],
     long_description=codecs.open('README.rst', 'r', 'utf-8').read(),
     classifiers=[
         "Development Status :: 3 - Alpha",
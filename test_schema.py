@@ -1,9 +1,11 @@
 from __future__ import with_statement
 import os
+import threading
+import time
 
-from pytest import raises
+from pytest import raises, importorskip
 
-from schema import Schema, Use, And, Or, Optional, SchemaError
+from schema import Schema, Use, And, Or, Optional, SchemaError, Profile
 
 
 try:
@@ -357,3 +359,265 @@ def test_issue_9_prioritized_key_comparison_in_dicts():
     assert s.validate(data) == data
     data = {'ID': 10, 'FILE': None}
     assert s.validate(data) == data
+
+
+def test_compile():
+    s = Schema({'key': And(int, lambda n: n > 0), Optional('opt'): [str]})
+    compiled = s.compile()
+    assert s.compile() is compiled
+    assert compiled.validate({'key': 1, 'opt': ['a']}) == {'key': 1,
+                                                           'opt': ['a']}
+    with SE: compiled.validate({'key': 0})
+    with SE: compiled.validate({'key': 1, 'opt': [1]})
+
+
+def test_compile_recursive_schema():
+    tree = {'value': int}
+    tree['children'] = [tree]
+    s = Schema(tree)
+    data = {'value': 1, 'children': [{'value': 2, 'children': []}]}
+    assert s.validate(data) == data
+    with SE: s.validate({'value': 1, 'children': [{'value': '2'}]})
+
+
+def test_dict_literal_key_priority():
+    # Literal keys are matched before callables, callables before Optionals:
+    s = Schema({'a': 1, lambda k: k in 'ab': 2, Optional('b'): 3})
+    assert s.validate({'a': 1, 'b': 2}) == {'a': 1, 'b': 2}
+    with SE: s.validate({'a': 1, 'b': 3})
+    s = Schema({Optional('a'): 1, Optional(str): 2})
+    assert s.validate({'a': 1, 'b': 2}) == {'a': 1, 'b': 2}
+    # 1 == True, so both go through the same hash bucket:
+    assert Schema({1: str}).validate({True: 'x'}) == {True: 'x'}
+
+
+def test_dict_wide():
+    keys = ['field%d' % i for i in range(200)]
+    s = Schema(dict((Optional(k) if i % 2 else k, int)
+                    for i, k in enumerate(keys)))
+    data = dict((k, i) for i, k in enumerate(keys))
+    assert s.validate(data) == data
+    with SE: s.validate(dict(data, field0='x'))
+    with SE: s.validate(dict(data, extra=1))
+
+
+def test_error_path_and_data():
+    s = Schema({'items': [{'price': And(int, lambda n: n > 0)}]})
+    try:
+        s.validate({'items': [{'price': 1}, {'price': -1}]})
+    except SchemaError as e:
+        assert e.path == ('items', 1, 'price')
+        assert e.data == -1
+        assert e.autos[-1] == '<lambda>(-1) should evaluate to True'
+    else:
+        raise AssertionError('SchemaError not raised')
+    assert SchemaError('auto', 'error').path == ()
+
+
+def test_error_repr_is_bounded():
+    big = list(range(100000))
+    try:
+        Schema([str]).validate(big)
+    except SchemaError as e:
+        assert e.data == 0
+    try:
+        Schema(str).validate(big)
+    except SchemaError as e:
+        assert e.data is big
+        assert len(e.code) < 1000
+        assert e.code.endswith("should be instance of 'str'")
+
+
+def test_is_valid():
+    s = Schema({'name': And(str, len),
+                'age': And(Use(int), lambda n: 18 <= n <= 99),
+                Optional('tags'): [Or('a', 'b')],
+                Optional(str): object})
+    assert s.is_valid({'name': 'Sue', 'age': '28'})
+    assert s.is_valid({'name': 'Sue', 'age': 28, 'tags': ['a'], 'x': None})
+    assert not s.is_valid({'name': '', 'age': 28})
+    assert not s.is_valid({'name': 'Sue', 'age': 'x'})
+    assert not s.is_valid({'name': 'Sue', 'age': 100})
+    assert not s.is_valid({'name': 'Sue', 'age': 28, 'tags': ['c']})
+    assert not s.is_valid({'name': 'Sue'})
+    assert not s.is_valid({'name': 'Sue', 'age': 28, 1: 1})
+    assert not s.is_valid('Sue')
+    assert Schema(And([Use(int)], lambda l: sum(l) > 2)).is_valid(['1', '2'])
+    assert not Schema(Use(ve)).is_valid('x')
+    assert not Schema(se).is_valid('x')
+    assert Schema({Use(str): int}).is_valid({1: 1, 2: 2})
+    assert not Schema({Use(str): int}).is_valid({1: 1, '1': 2})
+
+
+def test_copy_false_preserves_identity():
+    data = {'a': [1, 2], 'b': {'c': 'x'}}
+    s = Schema({'a': [int], 'b': {'c': str}}, copy=False)
+    assert s.validate(data) is data
+    assert Schema({'a': [int], 'b': {'c': str}}).validate(data) is not data
+    with SE: s.validate({'a': [1, '2'], 'b': {'c': 'x'}})
+    with SE:
+        try:
+            s.validate({'a': [], 'b': {'c': 'x', 'd': 1}})
+        except SchemaError as e:
+            assert e.args[0] == "Wrong keys 'd' in {'c': 'x', 'd': 1}"
+            raise
+    # Subtrees that may change values are still rebuilt:
+    s = Schema({'a': [Use(int)], 'b': {'c': str}}, copy=False)
+    validated = s.validate({'a': ['1'], 'b': data['b']})
+    assert validated == {'a': [1], 'b': {'c': 'x'}}
+    assert validated['b'] is data['b']
+    s = Schema({Optional('a', default=1): int}, copy=False)
+    assert s.validate({}) == {'a': 1}
+
+
+def test_or_dispatch():
+    calls = []
+
+    def check(n):
+        calls.append(n)
+        return True
+    s = Schema([Or({'kind': 'a'}, And(int, check), str)])
+    assert s.validate([1, 'x', {'kind': 'a'}]) == [1, 'x', {'kind': 'a'}]
+    assert calls == [1]
+    with SE:
+        try:
+            s.validate([1.5])
+        except SchemaError as e:
+            assert e.autos[-1] == "1.5 should be instance of 'str'"
+            assert e.path == (0,)
+            raise
+    s = Or('a', 'b', 'c')
+    assert s.validate('c') == 'c'
+    with SE:
+        try:
+            s.validate('d')
+        except SchemaError as e:
+            assert e.autos == ["Or('a', 'b', 'c') did not validate 'd'",
+                               "'c' does not match 'd'"]
+            raise
+    assert Schema(Or(1, 2)).validate(True) is True
+    assert not Schema(Or('a', 'b')).is_valid(['a'])
+
+
+def test_iter_validate():
+    s = Schema([And(Use(int), lambda n: n > 0)])
+    items = s.iter_validate(str(i) for i in range(1, 4))
+    assert next(items) == 1
+    assert list(items) == [2, 3]
+    items = s.iter_validate(iter(['1', '0', '2']))
+    assert next(items) == 1
+    with SE:
+        try:
+            next(items)
+        except SchemaError as e:
+            assert e.path == (1,)
+            raise
+    with raises(TypeError):
+        Schema({'a': int}).iter_validate([])
+
+
+def test_pickle():
+    import pickle
+    s = Schema({'n': And(Use(int), Or(1, 2)), Optional('o', default=3): int},
+               error='bad')
+    s.validate({'n': '1'})
+    s = pickle.loads(pickle.dumps(s))
+    assert s.validate({'n': '2'}) == {'n': 2, 'o': 3}
+    try:
+        Schema({'a': [Or(int, Use(ve))]}).validate({'a': [1, 'x']})
+    except SchemaError as e:
+        e2 = pickle.loads(pickle.dumps(e))
+        assert type(e2) is SchemaError
+        assert (e2.autos, e2.errors, e2.path) == (e.autos, e.errors, e.path)
+        assert e2.code == e.code
+
+
+def test_validate_many():
+    s = Schema({'n': And(Use(int), lambda n: n > 0)})
+    records = [{'n': str(i)} for i in range(-2, 50)]
+    for workers in (1, 2):
+        results = s.validate_many(records, workers=workers, chunksize=7)
+        assert len(results) == len(records)
+        assert [type(r) for r in results[:3]] == [SchemaError] * 3
+        assert results[3:] == [{'n': i} for i in range(1, 50)]
+        assert results[0].path == ('n',)
+
+
+def test_profile():
+    profile = Profile()
+    s = Schema({'items': [{'price': And(Use(float), lambda p: p > 0)}],
+                Optional('tag'): Or(lambda t: t == 'y', str)})
+    data = {'items': [{'price': '1.5'}, {'price': 2}], 'tag': 'x'}
+    assert s.validate(data, profile=profile) == s.validate(data)
+    with SE:
+        s.validate({'items': [{'price': '-1'}]}, profile=profile)
+    stats = profile.stats
+    assert stats['root']['calls'] == 2
+    assert stats['root']['failures'] == 1
+    assert stats["root['items'][*]"]['calls'] == 3
+    assert stats["root['items'][*]['price']"]['failures'] == 1
+    assert stats["root['items'][*]['price'].and[0]"]['calls'] == 3
+    assert stats["root['items'][*]['price'].and[1]"]['failures'] == 1
+    assert stats["root['tag']"]['tried'] == 2
+    assert stats["root['tag'].or[0]"]['failures'] == 1
+    assert stats["root['tag'].or[1]"]['calls'] == 1
+    assert all(s['time'] >= 0 for s in stats.values())
+    report = profile.report(limit=3).splitlines()
+    assert len(report) == 4 and report[1].endswith(' root')
+
+
+def run_suite_with(monkeypatch, validate):
+    """Run every test taking no arguments with `validate` patched in."""
+    original = Schema.validate
+    monkeypatch.setattr(Schema, 'validate', lambda self, data, **options:
+                        original(self, data, **options) if options
+                        else validate(self, data))
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and not test.__code__.co_argcount:
+            test()
+
+
+def test_validate_with_executor(monkeypatch):
+    futures = importorskip('concurrent.futures')
+    original_validate = Schema.validate
+    running = [0, 0]  # now, most at once
+    lock = threading.Lock()
+
+    def exists(path):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return not path.endswith('missing')
+
+    s = Schema({'files': [{'path': And(str, exists), 'size': Use(int)}],
+                Optional('readme'): exists})
+    data = {'files': [{'path': 'f%d' % i, 'size': str(i)} for i in range(40)],
+            'readme': 'README'}
+    with futures.ThreadPoolExecutor(8) as executor:
+        assert s.validate(data, executor=executor) == s.validate(data)
+        assert running[1] > 1
+        data['files'][7]['path'] = 'missing'
+        data['files'][9]['size'] = 'x'
+        with raises(SchemaError) as x:
+            s.validate(data, executor=executor)
+        assert x.value.path == ('files', 7, 'path')
+        assert "exists('missing')" in x.value.code
+        # The whole suite passes with an executor, errors included:
+        run_suite_with(monkeypatch, lambda self, data:
+                       original_validate(self, data, executor=executor))
+
+
+def test_codegen_backend(monkeypatch):
+    s = Schema({'a': [Or(int, Use(float))], Optional('b'): str})
+    generated = s.compile('codegen')
+    assert s.compile('codegen') is generated
+    assert 'isinstance' in generated.source
+    assert generated.validate({'a': [1, '2.5']}) == {'a': [1, 2.5]}
+    with raises(ValueError):
+        s.compile('no such backend')
+    # The whole suite passes with the generated code, errors included:
+    run_suite_with(monkeypatch, lambda self, data:
+                   self.compile('codegen').validate(data))
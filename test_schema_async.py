@@ -0,0 +1,95 @@
+import asyncio
+import re
+
+from pytest import raises
+
+from schema import Schema, Use, AsyncUse, And, Or, Optional, SchemaError
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def errors(schema, data, validate_async=False):
+    try:
+        if validate_async:
+            run(schema.validate_async(data))
+        else:
+            schema.validate(data)
+    except SchemaError as x:
+        autos = [re.sub(r'(Async)?Use|<function \S+ at \w+>', '', a)
+                 for a in x.autos if a is not None]
+        return autos, x.errors, x.path
+    raise AssertionError('%r did not fail' % (data,))
+
+
+async def positive(n):
+    await asyncio.sleep(0)
+    return n > 0
+
+
+async def double(n):
+    await asyncio.sleep(0)
+    return 2 * int(n)
+
+
+def test_validate_async():
+    s = Schema({'a': [AsyncUse(double)], 'b': And(int, positive),
+                Optional('c', default=0): Or(positive, str)})
+    assert run(s.validate_async({'a': ['1', 2], 'b': 3})) == \
+        {'a': [2, 4], 'b': 3, 'c': 0}
+    assert run(Schema([int]).validate_async([1, 2])) == [1, 2]
+    with raises(TypeError):
+        s.validate({'a': [], 'b': 1})
+    with raises(TypeError):
+        AsyncUse(double).validate(1)
+
+
+def test_validate_async_errors():
+    def sync_positive(n):
+        return n > 0
+    sync_positive.__name__ = 'positive'
+
+    def sync_double(n):
+        return 2 * int(n)
+    sync_double.__name__ = 'double'
+
+    def schemas(positive, use, double):
+        return Schema({'a': [use(double, error='not a number')],
+                       'b': And(int, Schema(positive, error='not positive')),
+                       Optional('c'): Or(positive, str)})
+    sync = schemas(sync_positive, Use, sync_double)
+    async_ = schemas(positive, AsyncUse, double)
+    for data in [{'a': [1, 'x', 'y'], 'b': 1},
+                 {'a': [], 'b': -1},
+                 {'a': [], 'b': 1, 'c': -1},
+                 {'a': [], 'b': 1, 'c': None},
+                 {'a': [1]},
+                 {'a': ['x'], 'b': -1},
+                 {'a': [1], 'b': 1, 'd': 0}]:
+        assert errors(async_, data, True) == errors(sync, data)
+
+
+def test_validate_async_concurrency():
+    running = [0, 0]  # now, most at once
+
+    async def exists(user_id):
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return user_id % 7 != 3
+
+    s = Schema({'ids': [And(int, exists)]})
+    assert run(s.validate_async({'ids': list(range(0, 500, 7))})) == \
+        {'ids': list(range(0, 500, 7))}
+    assert running[1] == len(range(0, 500, 7))
+    running[1] = 0
+    with raises(SchemaError) as x:
+        run(s.validate_async({'ids': list(range(500))}, limit=10))
+    assert x.value.path == ('ids', 3)
+    assert running[1] == 10